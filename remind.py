@@ -18,21 +18,34 @@
 
 from collections.abc import Iterable
 from datetime import date, datetime, timedelta
+from functools import lru_cache
 from hashlib import md5
+from itertools import pairwise
 from json import JSONDecodeError, loads
-from os.path import expanduser, getmtime, isfile
-from re import DOTALL, findall, match
+from os import stat
+from os.path import expanduser, isfile
+from re import findall, match
 from socket import getfqdn
 from subprocess import run
 from threading import Lock
-from time import time
+from time import monotonic, time
 from typing import Any
 from zoneinfo import ZoneInfo
 
 from dateutil import rrule, tz
 
 from vobject import iCalendar
-from vobject.base import Component, readOne
+from vobject.base import Component, newFromBehavior, readOne
+
+# getfqdn() may block on name resolution, only do it once per process.
+_getfqdn = lru_cache(maxsize=1)(getfqdn)
+
+_MONTHS = (
+    "Jan", "Feb", "Mar", "Apr", "May", "Jun",
+    "Jul", "Aug", "Sep", "Oct", "Nov", "Dec",
+)
+_WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+_CLASSES = ("PUBLIC", "PRIVATE", "CONFIDENTIAL")
 
 
 class Remind:
@@ -59,10 +72,17 @@ class Remind:
         self._startdate = startdate or date.today() - timedelta(weeks=12)
         self._month = month
         self._alarm = alarm or timedelta(minutes=-10)
+        # trigger and action are the same for all alarms, only copied per event
+        self._valarm: Component | None = None
+        if self._alarm != timedelta():
+            self._valarm = newFromBehavior("valarm")
+            self._valarm.add("trigger").value = self._alarm
+            self._valarm.add("action").value = "DISPLAY"
         self._lock = Lock()
         self._reminders: dict[str, dict[str, Any]] = {}
         self._mtime = 0.0
-        self._fqdn = fqdn or getfqdn()
+        self._last_check = 0.0
+        self._fqdn = fqdn or _getfqdn()
 
     def _parse_remind(
         self, filename: str, lines: str = ""
@@ -82,34 +102,45 @@ class Remind:
             str(self._startdate),
         ]
         try:
-            process = run(cmd, input=lines, capture_output=True, check=False, text=True)
+            process = run(
+                cmd, input=lines.encode("utf-8"), capture_output=True, check=False
+            )
         except FileNotFoundError as error:
             raise FileNotFoundError(
                 "remind command not found, please install it"
             ) from error
 
-        if "Unknown option" in process.stderr:
+        # stdout is passed to json.loads() as bytes, only decode the diagnostics
+        stderr = process.stderr.decode("utf-8", errors="replace")
+
+        if "Unknown option" in stderr:
             raise OSError(f'Error running: {" ".join(cmd)}, maybe old remind version')
 
-        if f"Can't open file: {filename}" in process.stderr:
+        if f"Can't open file: {filename}" in stderr:
             return {filename: {}}
 
-        err = list(set(findall(r"Can't open file: (.*)", process.stderr)))
+        err = list(set(findall(r"Can't open file: (.*)", stderr)))
         if err:
             raise FileNotFoundError(
                 f'include file(s): {", ".join(err)} not found (please use absolute paths)'
             )
 
         reminders: dict[str, dict[str, Any]] = {}
+        # recurring reminders share the tags (and thereby the UID) of their line
+        uids: dict[str, str] = {}
+        # seen dtstarts per file and UID, to skip duplicates without scanning the list
+        dtstarts: dict[tuple[str, str], set[date]] = {}
         for source in list(
-            set(findall(r"Caching file `(.*)' in memory", process.stderr))
+            set(findall(r"Caching file `(.*)' in memory", stderr))
         ):
             reminders[source] = {}
-            if isfile(source):
+            try:
                 # There is a race condition with the remind call above here.
-                mtime = getmtime(source)
-                if mtime > self._mtime:
-                    self._mtime = mtime
+                mtime = stat(source).st_mtime
+            except OSError:
+                continue
+            if mtime > self._mtime:
+                self._mtime = mtime
 
         try:
             months = loads(process.stdout)
@@ -126,24 +157,27 @@ class Remind:
                     else:
                         continue
 
-                entry["uid"] = f"{entry['tags'].split(',')[-1][7:]}@{self._fqdn}"
+                if entry["tags"] not in uids:
+                    uids[entry["tags"]] = f"{entry['tags'].rsplit(',', 1)[-1][7:]}@{self._fqdn}"
+                entry["uid"] = uids[entry["tags"]]
 
+                # remind uses ISO 8601, fromisoformat() is much faster than strptime()
                 if "eventstart" in entry:
-                    dtstart: datetime | date = datetime.strptime(
-                        entry["eventstart"], "%Y-%m-%dT%H:%M"
+                    dtstart: datetime | date = datetime.fromisoformat(
+                        entry["eventstart"]
                     ).replace(tzinfo=self._localtz)
                 else:
-                    dtstart = datetime.strptime(entry["date"], "%Y-%m-%d").date()
+                    dtstart = date.fromisoformat(entry["date"])
 
-                if entry["uid"] in reminders[entry["filename"]]:
-                    if (
-                        dtstart
-                        not in reminders[entry["filename"]][entry["uid"]]["dtstart"]
-                    ):
+                key = (entry["filename"], entry["uid"])
+                if key in dtstarts:
+                    if dtstart not in dtstarts[key]:
+                        dtstarts[key].add(dtstart)
                         reminders[entry["filename"]][entry["uid"]]["dtstart"].append(
                             dtstart
                         )
                 else:
+                    dtstarts[key] = {dtstart}
                     entry["dtstart"] = [dtstart]
                     reminders[entry["filename"]][entry["uid"]] = entry
 
@@ -153,41 +187,37 @@ class Remind:
     def _interval(dates: list[date]) -> int:
         """Return the distance between all dates and 0 if they are different."""
         interval = (dates[1] - dates[0]).days
-        last = dates[0]
-        for dat in dates[1:]:
-            if (dat - last).days != interval:
-                return 0
-            last = dat
-        return interval
+        if (dates[-1] - dates[0]).days != interval * (len(dates) - 1):
+            return 0
+        if all((second - first).days == interval for first, second in pairwise(dates)):
+            return interval
+        return 0
+
+    @staticmethod
+    def _rrule(freq: str, interval: int, count: int) -> str:
+        """Serialized iCal RRULE, same as python-vobject would generate it."""
+        if interval == 1:
+            return f"FREQ={freq};COUNT={count}"
+        return f"FREQ={freq};INTERVAL={interval};COUNT={count}"
 
     @staticmethod
     def _gen_dtend_rrule(dtstarts: list[date], vevent: Component) -> None:
         """Generate an rdate or rrule from a list of dates and add it to the vevent."""
         interval = Remind._interval(dtstarts)
+        count = len(dtstarts)
+        timed = isinstance(dtstarts[0], datetime)
         if interval > 0 and interval % 7 == 0:
-            rset = rrule.rruleset()
-            rset.rrule(
-                rrule.rrule(
-                    freq=rrule.WEEKLY, interval=interval // 7, count=len(dtstarts)
-                )
-            )
-            vevent.rruleset = rset
+            vevent.add("rrule").value = Remind._rrule("WEEKLY", interval // 7, count)
         elif interval > 1:
-            rset = rrule.rruleset()
-            rset.rrule(
-                rrule.rrule(freq=rrule.DAILY, interval=interval, count=len(dtstarts))
-            )
-            vevent.rruleset = rset
+            vevent.add("rrule").value = Remind._rrule("DAILY", interval, count)
         elif interval > 0:
-            if isinstance(dtstarts[0], datetime):
-                rset = rrule.rruleset()
-                rset.rrule(rrule.rrule(freq=rrule.DAILY, count=len(dtstarts)))
-                vevent.rruleset = rset
+            if timed:
+                vevent.add("rrule").value = Remind._rrule("DAILY", 1, count)
             else:
                 vevent.add("dtend").value = dtstarts[-1] + timedelta(days=1)
         else:
             rset = rrule.rruleset()
-            if isinstance(dtstarts[0], datetime):
+            if timed:
                 for dat in dtstarts:
                     rset.rdate(dat)
             else:
@@ -200,7 +230,7 @@ class Remind:
             vevent.dtstart.value = dtstarts[0] - timedelta(days=1)
             vevent.rruleset = rset
             vevent.dtstart.value = dtstarts[0]
-            if not isinstance(dtstarts[0], datetime):
+            if not timed:
                 vevent.add("dtend").value = dtstarts[0] + timedelta(days=1)
 
     def _gen_vevent(self, event: dict[str, Any], vevent: Component) -> None:
@@ -208,15 +238,18 @@ class Remind:
         vevent.add("dtstart").value = event["dtstart"][0]
 
         msg = event["body"].strip().replace('["["]', "[")
-        groups = match(r'%"(.*)%"(\n| )(.*)', msg, DOTALL)
-        if groups:
-            msg = groups[1]
-            vevent.add("description").value = groups[3]
-
-        groups = match(r"^(.*) at (.*)$", msg)
-        if groups:
-            msg = groups[1]
-            vevent.add("location").value = groups[2]
+        # %"summary%" description, split at the last %" followed by a space or newline
+        if msg.startswith('%"'):
+            end = max(msg.rfind('%" '), msg.rfind('%"\n'))
+            if end >= 2:
+                vevent.add("description").value = msg[end + 3:]
+                msg = msg[2:end]
+
+        # only single line messages have a location
+        summary, sep, location = msg.rpartition(" at ")
+        if sep and "\n" not in msg[:-1]:
+            msg = summary
+            vevent.add("location").value = location.removesuffix("\n")
 
         vevent.add("dtstamp").value = datetime.fromtimestamp(self._mtime)
         vevent.add("summary").value = msg
@@ -225,22 +258,18 @@ class Remind:
         if "tags" in event:
             tags = event["tags"].split(",")[:-1]
 
-            classes = ["PUBLIC", "PRIVATE", "CONFIDENTIAL"]
-
-            tag_class = [tag for tag in tags if tag in classes]
+            tag_class = [tag for tag in tags if tag in _CLASSES]
             if tag_class:
                 vevent.add("class").value = tag_class[0]
 
-            categories = [tag for tag in tags if tag not in classes]
+            categories = [tag for tag in tags if tag not in _CLASSES]
 
             if categories:
                 vevent.add("categories").value = categories
 
         if isinstance(event["dtstart"][0], datetime):
-            if self._alarm != timedelta():
-                valarm = vevent.add("valarm")
-                valarm.add("trigger").value = self._alarm
-                valarm.add("action").value = "DISPLAY"
+            if self._valarm:
+                valarm = vevent.add(Component.duplicate(self._valarm))
                 valarm.add("description").value = msg
 
             if "eventduration" in event:
@@ -256,7 +285,14 @@ class Remind:
 
     def _update(self) -> None:
         """Reload Remind files if the mtime is newer."""
-        update = not self._reminders
+        reminders = self._reminders
+        update = not reminders
+
+        # Throttle the stat() calls for callers polling in a tight loop, our own
+        # modifications reset _last_check.
+        if not update and monotonic() - self._last_check < 1.0:
+            return
+        self._last_check = monotonic()
 
         now = time()
         if (
@@ -267,14 +303,22 @@ class Remind:
             update = True
             self._mtime = now
 
-        with self._lock:
-            for fname in self._reminders:
-                if not isfile(fname) or getmtime(fname) > self._mtime:
+        # Check without the lock, so readers don't serialize on it if nothing
+        # changed. The reminders are only ever replaced, never modified.
+        for fname in reminders:
+            try:
+                if stat(fname).st_mtime > self._mtime:
                     update = True
                     break
+            except OSError:
+                update = True
+                break
 
-            if update:
-                self._reminders = self._parse_remind(self._filename)
+        if update:
+            with self._lock:
+                # skip if another thread reloaded while we waited for the lock
+                if self._reminders is reminders:
+                    self._reminders = self._parse_remind(self._filename)
 
     def get_filesnames(self) -> list[str]:
         """All filenames parsed by remind (including included files)."""
@@ -283,7 +327,19 @@ class Remind:
 
     def _get_uid(self, line: str) -> str:
         """UID of a remind line."""
-        return f"{md5(line.strip().encode('utf-8')).hexdigest()}@{self._fqdn}"
+        return f"{md5(line.encode('utf-8').strip()).hexdigest()}@{self._fqdn}"
+
+    @staticmethod
+    def _find_uid(lines: list[bytes], uid: str) -> int:
+        """Index of the line with the given UID (without host part) or -1."""
+        return next(
+            (
+                index
+                for (index, line) in enumerate(lines)
+                if uid == md5(line.strip()).hexdigest()
+            ),
+            -1,
+        )
 
     def get_uids(self, filename: str = "") -> list[str]:
         """UIDs of all reminders in the file excluding included files.
@@ -367,19 +423,24 @@ class Remind:
             self._gen_vevent(event, cal.add("vevent"))
         return cal
 
+    @staticmethod
+    def _rem_date(dat: date) -> str:
+        """Format a date in Remind syntax, independent of the locale."""
+        return f"{_MONTHS[dat.month - 1]} {dat.day} {dat.year}"
+
     @staticmethod
     def _parse_rdate(rdates: list[date], repeat: int = 1) -> str:
         """Convert from iCal rdate to Remind trigdate syntax."""
         rdates = sorted(rdates)
         if len(rdates) == 1 and repeat == 1:
-            return rdates[0].strftime("%Y-%m-%d")
-        start = rdates[0].strftime("FROM %Y-%m-%d")
+            return date.isoformat(rdates[0])
+        start = f"FROM {date.isoformat(rdates[0])}"
         trigdates = [
-            (rdate + timedelta(days=d)).strftime("$T=='%Y-%m-%d'")
+            f"$T=='{date.isoformat(rdate + timedelta(days=d))}'"
             for rdate in rdates
             for d in range(repeat)
         ]
-        end = (rdates[-1] + timedelta(days=repeat-1)).strftime("UNTIL %Y-%m-%d")
+        end = f"UNTIL {date.isoformat(rdates[-1] + timedelta(days=repeat-1))}"
         return f"{start} {end} SATISFY [{'||'.join(trigdates)}]"
 
     @staticmethod
@@ -393,7 +454,6 @@ class Remind:
         if rruleset._rrule[0]._freq == 0:
             return []
 
-        weekdays = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
         rep = []
         if rruleset._rrule[0]._byweekday and len(rruleset._rrule[0]._byweekday) > 1:
             rep.append("*1")
@@ -409,22 +469,20 @@ class Remind:
             rruleset._rrule[0]._freq == rrule.MONTHLY and rruleset._rrule[0]._bynweekday
         ):
             daynum, week = rruleset._rrule[0]._bynweekday[0]
-            weekday = weekdays[daynum]
+            weekday = _WEEKDAYS[daynum]
             rep.append(f"{weekday} {week * 7 - 6}")
         else:
             return Remind._parse_rdate(rruleset._rrule[0])
 
         if rruleset._rrule[0]._byweekday and len(rruleset._rrule[0]._byweekday) > 1:
             daynums = set(range(7)) - set(rruleset._rrule[0]._byweekday)
-            days = [weekdays[day] for day in daynums]
+            days = [_WEEKDAYS[day] for day in daynums]
             rep.append(f"SKIP OMIT {' '.join(days)}")
 
         if rruleset._rrule[0]._until:
-            rep.append(
-                rruleset._rrule[0]._until.strftime("UNTIL %b %d %Y").replace(" 0", " ")
-            )
+            rep.append(f"UNTIL {Remind._rem_date(rruleset._rrule[0]._until)}")
         elif rruleset._rrule[0]._count:
-            rep.append(rruleset[-1].strftime("UNTIL %b %d %Y").replace(" 0", " "))
+            rep.append(f"UNTIL {Remind._rem_date(rruleset[-1])}")
 
         return rep
 
@@ -520,14 +578,14 @@ class Remind:
                 not hasattr(vevent, "rrule")
                 or vevent.rruleset._rrule[0]._freq != rrule.MONTHLY
             ):
-                remind.append(dtstart.strftime("%b %d %Y").replace(" 0", " "))
+                remind.append(Remind._rem_date(dtstart))
             elif (
                 hasattr(vevent, "rrule")
                 and vevent.rruleset._rrule[0]._freq == rrule.MONTHLY
                 and trigdates
             ):
                 remind.extend(trigdates)
-                trigdates = dtstart.strftime("SATISFY [$T>='%Y-%m-%d']")
+                trigdates = f"SATISFY [$T>='{date.isoformat(dtstart)}']"
 
         if postdate:
             remind.append(postdate)
@@ -542,10 +600,10 @@ class Remind:
             remind.append("*1")
             if dtend is not None:
                 dtend -= timedelta(days=1)
-                remind.append(dtend.strftime("UNTIL %b %d %Y").replace(" 0", " "))
+                remind.append(f"UNTIL {Remind._rem_date(dtend)}")
 
         if isinstance(dtstart, datetime):
-            remind.append(dtstart.strftime("AT %H:%M").replace(" 0", " "))
+            remind.append(f"AT {dtstart.hour}:{dtstart.minute:02}")
 
             if posttime:
                 remind.append(posttime)
@@ -604,10 +662,11 @@ class Remind:
         if not filename:
             filename = self._filename
 
+        outdat = self.to_reminders(ical)
         with self._lock:
-            outdat = self.to_reminders(ical)
             with open(filename, "a", encoding="utf-8") as outfile:
                 outfile.write(outdat)
+            self._last_check = 0.0
 
         return self._get_uid(outdat)
 
@@ -619,14 +678,14 @@ class Remind:
         uid = uid.split("@")[0]
 
         with self._lock:
-            with open(filename, encoding="utf-8") as infile:
+            with open(filename, "rb") as infile:
                 rem = infile.readlines()
-            for (index, line) in enumerate(rem):
-                if uid == md5(line.strip().encode("utf-8")).hexdigest():
-                    del rem[index]
-                    with open(filename, "w", encoding="utf-8") as outfile:
-                        outfile.writelines(rem)
-                    break
+            index = Remind._find_uid(rem, uid)
+            if index >= 0:
+                del rem[index]
+                with open(filename, "wb") as outfile:
+                    outfile.writelines(rem)
+                self._last_check = 0.0
 
     def replace_vobject(self, uid: str, ical: Component, filename: str = "") -> str:
         """Update the Remind command with the uid in the file with the new iCalendar."""
@@ -634,17 +693,19 @@ class Remind:
             filename = self._filename
 
         uid = uid.split("@")[0]
+        outdat = self.to_reminders(ical)
 
         with self._lock:
-            with open(filename, encoding="utf-8") as infile:
+            with open(filename, "rb") as infile:
                 rem = infile.readlines()
-            for (index, line) in enumerate(rem):
-                if uid == md5(line.strip().encode("utf-8")).hexdigest():
-                    rem[index] = self.to_reminders(ical)
-                    new_uid = self._get_uid(rem[index])
-                    with open(filename, "w", encoding="utf-8") as outfile:
-                        outfile.writelines(rem)
-                    return new_uid
+            index = Remind._find_uid(rem, uid)
+            if index >= 0:
+                rem[index] = outdat.encode("utf-8")
+                new_uid = self._get_uid(outdat)
+                with open(filename, "wb") as outfile:
+                    outfile.writelines(rem)
+                self._last_check = 0.0
+                return new_uid
         raise ValueError(f"Failed to find uid {uid} in {filename}")
 
     def move_vobject(self, uid: str, from_file: str, to_file: str) -> None:
@@ -652,16 +713,18 @@ class Remind:
         uid = uid.split("@")[0]
 
         with self._lock:
-            with open(from_file, encoding="utf-8") as infile:
+            with open(from_file, "rb") as infile:
                 rem = infile.readlines()
-            for (index, line) in enumerate(rem):
-                if uid == md5(line.strip().encode("utf-8")).hexdigest():
-                    del rem[index]
-                    with open(from_file, "w", encoding="utf-8") as outfile:
-                        outfile.writelines(rem)
-                    with open(to_file, "a", encoding="utf-8") as outfile:
-                        outfile.writelines(rem)
-                    break
+            index = Remind._find_uid(rem, uid)
+            if index >= 0:
+                moved = rem.pop(index)
+                if not moved.endswith(b"\n"):
+                    moved += b"\n"
+                with open(from_file, "wb") as outfile:
+                    outfile.writelines(rem)
+                with open(to_file, "ab") as outfile:
+                    outfile.write(moved)
+                self._last_check = 0.0
 
     @staticmethod
     def get_meta() -> dict[str, str]:
@@ -752,12 +815,12 @@ def rem2ics() -> None:
         )
         vobject = remind.stdin_to_vobject(stdin.read())
         if vobject:
-            args.outfile.write(vobject.serialize())
+            vobject.serialize(args.outfile)
     else:
         remind = Remind(
             args.infile, zone, args.startdate, args.month, timedelta(minutes=args.alarm)
         )
-        args.outfile.write(remind.to_vobject().serialize())
+        remind.to_vobject().serialize(args.outfile)
 
 
 def ics2rem() -> None:
@@ -817,15 +880,18 @@ def ics2rem() -> None:
     zone = ZoneInfo(args.zone) if args.zone else None
 
     vobject = readOne(args.infile.read())
-    rem = Remind(localtz=zone).to_reminders(
-        vobject,
-        args.label,
-        args.priority,
-        args.tag,
-        args.tail,
-        args.sep,
-        args.postdate,
-        args.posttime,
-        args.locations,
-    )
-    args.outfile.write(rem)
+    remind = Remind(localtz=zone)
+    for vevent in getattr(vobject, "vevent_list", []):
+        args.outfile.write(
+            remind.to_remind(
+                vevent,
+                args.label,
+                args.priority,
+                args.tag,
+                args.tail,
+                args.sep,
+                args.postdate,
+                args.posttime,
+                args.locations,
+            )
+        )
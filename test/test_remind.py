@@ -0,0 +1,136 @@
+# Unit tests for remind.py
+#
+# Copyright (C) 2014-2021  Jochen Sprickerhof
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from datetime import date
+from itertools import product
+from pathlib import Path
+from re import DOTALL, match
+
+import pytest
+from vobject import iCalendar
+from vobject.base import Component
+
+from remind import Remind
+
+
+def test_find_uid_unicode_whitespace() -> None:
+    remind = Remind(fqdn="localhost")
+    line = "REM Jan 5 2024 MSG 会議　\n"
+
+    uid = remind._get_uid(line).split("@")[0]
+    lines = [b"REM Jan 4 2024 MSG other\n", line.encode("utf-8")]
+    assert Remind._find_uid(lines, uid) == 1
+
+
+def test_move_vobject(tmp_path: Path) -> None:
+    remind = Remind(fqdn="localhost")
+    from_file = tmp_path / "from.rem"
+    to_file = tmp_path / "to.rem"
+    from_file.write_text("REM Jan 4 2024 MSG stay\nREM Jan 5 2024 MSG move\n", encoding="utf-8")
+    to_file.write_text("REM Jan 6 2024 MSG existing\n", encoding="utf-8")
+
+    remind.move_vobject(
+        remind._get_uid("REM Jan 5 2024 MSG move\n"), str(from_file), str(to_file)
+    )
+    assert from_file.read_text(encoding="utf-8") == "REM Jan 4 2024 MSG stay\n"
+    assert to_file.read_text(encoding="utf-8") == (
+        "REM Jan 6 2024 MSG existing\nREM Jan 5 2024 MSG move\n"
+    )
+
+
+def _gen_vevent(body: str) -> Component:
+    vevent = iCalendar().add("vevent")
+    Remind(fqdn="localhost")._gen_vevent(
+        {"uid": "uid", "body": body, "dtstart": [date(2024, 1, 5)]}, vevent
+    )
+    return vevent
+
+
+def _summary_description(body: str) -> tuple[str, str | None]:
+    vevent = _gen_vevent(body)
+    description = vevent.description.value if hasattr(vevent, "description") else None
+    return vevent.summary.value, description
+
+
+@pytest.mark.parametrize(
+    "body,expected",
+    [
+        ("Foo", ("Foo", None)),
+        ('%"Foo%" Bar', ("Foo", "Bar")),
+        ('%"Foo%"\nBar', ("Foo", "Bar")),
+        ('%"Foo%"Bar', ('%"Foo%"Bar', None)),
+        ('%"%" x', ("", "x")),
+        ('%" x', ('%" x', None)),
+        ('%"Foo%" Bar%" Baz', ('Foo%" Bar', "Baz")),
+        ('%"Foo%"\nBar%" Baz', ('Foo%"\nBar', "Baz")),
+        ('%"Foo%" Bar%"Baz', ("Foo", 'Bar%"Baz')),
+        ('x%"Foo%" Bar', ('x%"Foo%" Bar', None)),
+    ],
+)
+def test_gen_vevent_description(body: str, expected: tuple[str, str | None]) -> None:
+    assert _summary_description(body) == expected
+
+
+def test_gen_vevent_description_regex() -> None:
+    # the split used to be done by this regex, compare on all short bodies
+    for length in range(1, 6):
+        for chars in product(['%"', " ", "\n", "a"], repeat=length):
+            body = "".join(chars)
+            groups = match(r'%"(.*)%"(\n| )(.*)', body.strip(), DOTALL)
+            if groups:
+                assert _summary_description(body) == (groups[1], groups[3])
+            else:
+                assert _summary_description(body) == (body.strip(), None)
+
+
+def _summary_location(summary: str) -> tuple[str, str | None]:
+    # wrap in %"..%" so the summary isn't stripped
+    vevent = _gen_vevent(f'%"{summary}%" description')
+    location = vevent.location.value if hasattr(vevent, "location") else None
+    return vevent.summary.value, location
+
+
+@pytest.mark.parametrize(
+    "summary,expected",
+    [
+        ("Foo", ("Foo", None)),
+        ("Foo at Bar", ("Foo", "Bar")),
+        ("Foo at Bar at Baz", ("Foo at Bar", "Baz")),
+        ("Foo at Bar\n", ("Foo", "Bar")),
+        ("Foo at \n", ("Foo", "")),
+        ("Foo at\n", ("Foo at\n", None)),
+        ("Foo\nBar at Baz", ("Foo\nBar at Baz", None)),
+        ("Foo at Bar\nBaz", ("Foo at Bar\nBaz", None)),
+        ("Foo at Bar\n\n", ("Foo at Bar\n\n", None)),
+        ("Foo at", ("Foo at", None)),
+        ("Foo atBar", ("Foo atBar", None)),
+    ],
+)
+def test_gen_vevent_location(summary: str, expected: tuple[str, str | None]) -> None:
+    assert _summary_location(summary) == expected
+
+
+def test_gen_vevent_location_regex() -> None:
+    # the split used to be done by this regex, compare on all short summaries
+    for length in range(1, 6):
+        for chars in product([" at ", " ", "\n", "a"], repeat=length):
+            summary = "".join(chars)
+            groups = match(r"^(.*) at (.*)$", summary)
+            if groups:
+                assert _summary_location(summary) == (groups[1], groups[2])
+            else:
+                assert _summary_location(summary) == (summary, None)